@@ -7,53 +7,104 @@ from pathlib import Path
 from datetime import datetime
 
 from rich.console import Console
-from rich.logging import RichHandler
 from rich.traceback import install as install_rich_tracebacks
 
 from portfolio import Portfolio
+from strategy import load_strategy
+from background import Background
 from exchanges.exchange import Exchange
-from exchanges.kraken import KrakenExchange
-from utils import display_portfolio_assets, write_portfolio_assets, display_orders
+from execution import ExecutionEngine, STRATEGIES
+from utils import (
+    configure_logging,
+    display_portfolio_assets,
+    write_portfolio_assets,
+    display_orders,
+    display_executions,
+    display_order_results,
+)
 
 log = logging.getLogger(__name__)
 install_rich_tracebacks()
 console = Console()
 
-import toml
 import click
 from click_shell import shell
 
 from dataclasses import dataclass
 
-EXCHANGES = {"kraken": KrakenExchange}
-
-
-def validate_strategy(strategy):
-    for field in ["currency", "portfolio", "exchange"]:
-        if not field in strategy:
-            log.critical(f"{field} not defined in strategy file")
-            return False
-
-    for field in ["platform", "key", "secret"]:
-        if not field in strategy["exchange"]:
-            log.critical(f"{field} not defined for the exchange")
-            return False
-
-    if not strategy["exchange"]["platform"] in EXCHANGES:
-        log.error(f"Exchange platform not supported")
-        sys.exit()
-
-    return True
-
 
 @dataclass
 class State:
     portfolio: Portfolio
     exchange: Exchange
     currency: str
+    background: Background
+    connected: bool = False
+
+
+def connect(state, portfolio, cancel=None):
+    log.info("Fetching assets prices / allocations...")
+    started = datetime.now()
+    portfolio.connect(state.exchange)
+    if cancel and cancel.is_set():
+        log.info("Refresh cancelled, keeping the previous portfolio")
+        return
+    # the refreshed portfolio replaces the previous one in a single assignment,
+    # so commands always read a consistent snapshot of it
+    state.portfolio = portfolio
+    state.connected = True
+    elapsed = (datetime.now() - started).total_seconds()
+    log.info(f"Portfolio refreshed in {elapsed:.1f}s")
+
+
+def start_refresh(state):
+    task = state.background.get("refresh")
+    if task:
+        console.print(f"[yellow]A refresh is already running ({task.elapsed:.0f}s)")
+        return task
+    # connect a new portfolio in the background, rather than the current one,
+    # so commands can keep reading the current one until the refresh is over
+    portfolio = Portfolio(state.portfolio.model, state.currency)
+    return state.background.submit("refresh", connect, state, portfolio)
+
+
+def wait_for_refresh(task):
+    with console.status("[bold green]Connecting to exchange..."):
+        error = task.future.exception()
+    if error:
+        console.print(f"[red]Unable to refresh the portfolio: {error}")
+    return error
+
+
+def get_portfolio(state):
+    # if the portfolio was never connected, wait for the refresh in progress
+    # and stop the command if it failed, rather than using an empty portfolio
+    if not state.connected:
+        task = state.background.last("refresh")
+        if task and wait_for_refresh(task):
+            return None
+    if not state.connected:
+        console.print(
+            "[red]The portfolio is not connected to the exchange, "
+            "use [bold]refresh[/bold] to try again"
+        )
+        return None
+    return state.portfolio
+
+
+def on_shell_finished(ctx):
+    tasks = ctx.obj.background.running()
+    if tasks:
+        names = ", ".join([task.name for task in tasks])
+        console.print(f"[yellow]Cancelling the background tasks: {names}")
+    ctx.obj.background.shutdown()
 
 
-@shell(prompt="cryptodex $ ", hist_file=Path(".temp") / ".history")
+@shell(
+    prompt="cryptodex $ ",
+    hist_file=Path(".temp") / ".history",
+    on_finished=on_shell_finished,
+)
 @click.pass_context
 @click.argument("strategy", type=click.File("r"))
 @click.option("-v", "--verbose", is_flag=True, help="Increase output verbosity.")
@@ -64,36 +115,63 @@ def app(ctx, strategy, verbose):
     STRATEGY: path to the .toml strategy file - see README for more info
 
     Run the script without any commands to start an interactive shell.
+
+    To evaluate many strategy files at once, run cryptodex/batch.py instead.
     """
 
     # configure logging for the application
-    log = logging.getLogger()
-    log.setLevel(logging.INFO if not verbose else logging.DEBUG)
-    rich_handler = RichHandler()
-    rich_handler.setFormatter(logging.Formatter(fmt="%(message)s", datefmt="[%X]"))
-    log.addHandler(rich_handler)
-    log.propagate = False
+    configure_logging(verbose)
 
     # initialise application
-    data = toml.load(strategy)
-    if not validate_strategy(data):
+    try:
+        (portfolio, exchange, _, currency) = load_strategy(strategy)
+    except ValueError as e:
+        log.critical(e)
         sys.exit()
-
-    currency = data["currency"]
-    portfolio = Portfolio(data["portfolio"], currency)
-    exchange_platform = data["exchange"]["platform"]
-    exchange = EXCHANGES[exchange_platform](
-        data["exchange"]["key"], data["exchange"]["secret"]
-    )
-    with console.status("[bold green]Connecting to exchange..."):
-        portfolio.connect(exchange)
-    ctx.obj = State(portfolio, exchange, currency)
+    ctx.obj = State(portfolio, exchange, currency, Background())
+    start_refresh(ctx.obj)
 
 
 @app.command(help="Re-fetch current assets prices / allocations")
 @click.pass_obj
-def refresh(state):
-    state.portfolio.connect(state.exchange)
+@click.option("--wait", is_flag=True, help="Wait for the refresh to complete")
+def refresh(state, wait):
+    task = start_refresh(state)
+    if wait and not wait_for_refresh(task):
+        console.print("Portfolio refreshed")
+
+
+@app.command(help="List the tasks running in the background")
+@click.pass_obj
+def jobs(state):
+    for task in state.background.finished():
+        error = task.future.exception()
+        if error:
+            console.print(f"[bold]{task.name}[/bold]: [red]failed: {error}")
+        else:
+            console.print(f"[bold]{task.name}[/bold]: completed")
+        if task.name == "orders" and not error:
+            display_orders_result(*task.future.result())
+
+    tasks = state.background.running()
+    if not tasks:
+        console.print("No tasks running in the background")
+    for task in tasks:
+        cancelling = " (cancelling)" if task.cancel.is_set() else ""
+        console.print(
+            f"[bold]{task.name}[/bold]: running for {task.elapsed:.0f}s{cancelling}"
+        )
+
+
+@app.command(help="Cancel the tasks running in the background")
+@click.pass_obj
+@click.argument("name", required=False)
+def cancel(state, name):
+    tasks = state.background.cancel(name)
+    if not tasks:
+        console.print("No tasks to cancel")
+    for task in tasks:
+        console.print(f"Cancelling {task.name}...")
 
 
 @app.command(help="Display your current portfolio balance")
@@ -102,17 +180,62 @@ def refresh(state):
     "--log", is_flag=True, help="Log the current portfolio balance to a .csv file",
 )
 def balance(state, log):
-    display_portfolio_assets(state.portfolio.holdings, state.currency)
+    portfolio = get_portfolio(state)
+    if not portfolio:
+        return
+    display_portfolio_assets(portfolio.holdings, state.currency)
     if log:
         now = datetime.now()
         filename = Path(".balances") / f"{now.strftime('%Y%m%d')}.csv"
         if not filename.is_file():
             filename.parent.mkdir(parents=True, exist_ok=True)
         console.print(f"Writing balance to {str(filename)}")
-        write_portfolio_assets(filename, state.portfolio.holdings, state.currency)
-
+        write_portfolio_assets(filename, portfolio.holdings, state.currency)
+
+
+def process_orders(exchange, orders, mock=True, engine=None, cancel=None):
+    # returns either the executions of the engine, or the (order, success, info)
+    # results of the orders sent one by one, to be displayed once complete
+    if engine:
+        return (engine.execute(orders, mock=mock, cancel=cancel), None)
+    results = []
+    for order in [order for order in orders if order.units]:
+        if cancel and cancel.is_set():
+            results.append((order, False, "Cancelled"))
+            continue
+        results.append((order, *exchange.process_order(order, mock=mock)))
+    return (None, results)
+
+
+def display_orders_result(executions, results):
+    if executions is not None:
+        console.print("\n[bold]Achieved prices for the processed orders:")
+        display_executions(executions)
+    else:
+        console.print("\n[bold]Results of the processed orders:")
+        display_order_results(results)
+
+
+def invest(
+    portfolio,
+    exchange,
+    currency,
+    amount,
+    rebalance,
+    estimate,
+    mock=True,
+    engine=None,
+    background=None,
+):
+    # refuse to start another batch while one is running, as it would be built
+    # from the same portfolio snapshot and could send the same orders twice
+    if background and background.get("orders"):
+        console.print(
+            "[red]Orders are already being processed in the background, "
+            "wait for them to complete or use [bold]cancel orders[/bold] first"
+        )
+        return
 
-def invest(portfolio, exchange, currency, amount, rebalance, estimate, mock=True):
     with console.status("[bold green]Calculating investments..."):
         raw_orders = portfolio.invest(amount=amount, rebalance=rebalance)
         orders = sorted(raw_orders, key=lambda order: order.buy_or_sell, reverse=True)
@@ -148,12 +271,57 @@ def invest(portfolio, exchange, currency, amount, rebalance, estimate, mock=True
         )
 
     if click.confirm("Do you want to continue?"):
-        for order in [order for order in orders if order.units]:
-            (success, info) = exchange.process_order(order, mock=mock)
-            if success:
-                log.info("The order executed successfully: " + str(info))
-            else:
-                log.warning("There was a problem with the order: " + str(info))
+        if not background:
+            display_orders_result(
+                *process_orders(exchange, orders, mock=mock, engine=engine)
+            )
+            return
+        background.submit(
+            "orders", process_orders, exchange, orders, mock=mock, engine=engine
+        )
+        console.print(
+            "Orders are being processed in the background, use [bold]jobs[/bold] "
+            "to see their results or [bold]cancel orders[/bold] to stop them"
+        )
+
+
+def execution_options(function):
+    options = [
+        click.option(
+            "--execution",
+            type=click.Choice(STRATEGIES),
+            default="market",
+            help="How to send orders: as single market orders, split into child orders "
+            "capped by the order book depth, or spread over time (TWAP)",
+        ),
+        click.option(
+            "--slices", default=5, help="Number of child orders for TWAP execution",
+        ),
+        click.option(
+            "--interval", default=1.0, help="Seconds to wait between child orders",
+        ),
+        click.option(
+            "--max-slippage",
+            default=0.5,
+            help="Max % distance from the best price of the order book liquidity "
+            "used to size child orders",
+        ),
+    ]
+    for option in reversed(options):
+        function = option(function)
+    return function
+
+
+def get_engine(exchange, execution, slices, interval, max_slippage):
+    if execution == "market":
+        return None
+    return ExecutionEngine(
+        exchange,
+        strategy=execution,
+        slices=slices,
+        interval=interval,
+        max_slippage=max_slippage,
+    )
 
 
 @app.command(help="Invest a lump sum into the portfolio")
@@ -174,15 +342,23 @@ def invest(portfolio, exchange, currency, amount, rebalance, estimate, mock=True
     default=True,
     help="Only validate orders, do not send them to the exchange",
 )
-def buy(state, amount, rebalance, estimate, mock):
+@execution_options
+def buy(
+    state, amount, rebalance, estimate, mock, execution, slices, interval, max_slippage
+):
+    portfolio = get_portfolio(state)
+    if not portfolio:
+        return
     invest(
-        state.portfolio,
+        portfolio,
         state.exchange,
         state.currency,
         amount,
         rebalance,
         estimate,
         mock=mock,
+        engine=get_engine(state.exchange, execution, slices, interval, max_slippage),
+        background=state.background,
     )
 
 
@@ -204,15 +380,23 @@ def buy(state, amount, rebalance, estimate, mock):
     default=True,
     help="Only validate orders, do not send them to the exchange",
 )
-def sell(state, amount, rebalance, estimate, mock):
+@execution_options
+def sell(
+    state, amount, rebalance, estimate, mock, execution, slices, interval, max_slippage
+):
+    portfolio = get_portfolio(state)
+    if not portfolio:
+        return
     invest(
-        state.portfolio,
+        portfolio,
         state.exchange,
         state.currency,
         -amount,
         rebalance,
         estimate,
         mock=mock,
+        engine=get_engine(state.exchange, execution, slices, interval, max_slippage),
+        background=state.background,
     )
 
 
@@ -0,0 +1,92 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Task:
+    name: str
+    future: object = None
+    cancel: threading.Event = field(default_factory=threading.Event)
+    started: datetime = field(default_factory=datetime.now)
+    reported: bool = False
+
+    @property
+    def running(self):
+        return self.future is not None and not self.future.done()
+
+    @property
+    def elapsed(self):
+        return (datetime.now() - self.started).total_seconds()
+
+
+class Background:
+    """
+    runs slow exchange calls on a pool of background threads, so the interactive
+    shell stays responsive while they are in progress. every task receives a
+    threading.Event in its 'cancel' argument, which is set when the task should
+    stop at the next safe point.
+    """
+
+    def __init__(self, workers=2):
+        self.pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="cryptodex"
+        )
+        self.tasks = []
+        self.latest = {}
+        self.lock = threading.Lock()
+
+    def submit(self, name, function, *args, **kwargs):
+        task = Task(name)
+        with self.lock:
+            self.tasks = [t for t in self.tasks if t.running or not t.reported]
+            self.tasks.append(task)
+            self.latest[name] = task
+        task.future = self.pool.submit(self.run, task, function, *args, **kwargs)
+        return task
+
+    def run(self, task, function, *args, **kwargs):
+        try:
+            return function(*args, cancel=task.cancel, **kwargs)
+        except Exception as e:
+            log.error(f"{task.name} failed: {e}")
+            raise
+
+    def get(self, name):
+        with self.lock:
+            return next((t for t in self.tasks if t.name == name and t.running), None)
+
+    def last(self, name):
+        with self.lock:
+            return self.latest.get(name)
+
+    def running(self):
+        with self.lock:
+            return [task for task in self.tasks if task.running]
+
+    def finished(self):
+        # return the tasks which completed since the last call, so their results
+        # can be displayed from the shell rather than from the background threads
+        with self.lock:
+            tasks = [t for t in self.tasks if t.future.done() and not t.reported]
+            for task in tasks:
+                task.reported = True
+            return tasks
+
+    def cancel(self, name=None):
+        tasks = [task for task in self.running() if name is None or task.name == name]
+        for task in tasks:
+            task.cancel.set()
+        return tasks
+
+    def shutdown(self):
+        # cancel whatever is still running and wait for it to stop at its next
+        # safe point, so no orders keep being sent once the shell has exited
+        tasks = self.cancel()
+        self.pool.shutdown(wait=True)
+        return tasks
@@ -0,0 +1,224 @@
+import os
+import sys
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from rich.console import Console
+
+from portfolio import Portfolio, Market
+from strategy import load_strategy
+from exchanges.exchange import Exchange
+from utils import configure_logging, display_batch_report
+
+from pycoingecko import CoinGeckoAPI
+
+log = logging.getLogger(__name__)
+console = Console()
+
+import click
+
+from dataclasses import dataclass, field
+
+
+@dataclass
+class Account:
+    name: str
+    portfolio: Portfolio
+    exchange: Exchange
+    platform: str
+    currency: str
+    orders: list = field(default_factory=list)
+    error: str = None
+
+
+def run_batch(accounts, amount=0, rebalance=True, workers=8):
+    """
+    evaluate the portfolios of many accounts at once, fetching the market data and
+    the exchange catalogue only once for each currency and exchange platform, and
+    calculating the orders of each portfolio in parallel across a worker pool.
+    returns the accounts, with their holdings and pending orders filled up
+    """
+    # group the accounts by the market data they share, leaving out the ones
+    # which already failed (e.g. because of an invalid strategy file)
+    valid_accounts = [account for account in accounts if not account.error]
+    groups = {}
+    for account in valid_accounts:
+        groups.setdefault((account.platform, account.currency), []).append(account)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # fetch the coingecko market data once for each currency, and the assets
+        # available for trading once for each exchange platform / currency
+        currencies = sorted({account.currency for account in valid_accounts})
+        coins = dict(
+            zip(
+                currencies,
+                pool.map(
+                    lambda currency: fetch_coins(
+                        [a for a in valid_accounts if a.currency == currency],
+                        currency,
+                    ),
+                    currencies,
+                ),
+            )
+        )
+        # the markets of each platform are fetched one after the other, so its
+        # catalogue of assets is only loaded once and reused for every currency
+        platforms = {}
+        for key in groups:
+            platforms.setdefault(key[0], []).append(key)
+        markets = {}
+        for platform_markets in pool.map(
+            lambda keys: {
+                key: fetch_market(groups[key], coins[key[1]], reload=(i == 0))
+                for (i, key) in enumerate(keys)
+            },
+            platforms.values(),
+        ):
+            markets.update(platform_markets)
+
+        # build the holdings of each portfolio - only the balances of its own
+        # account need to be fetched from the exchange at this point
+        list(
+            pool.map(
+                lambda account: build_holdings(
+                    account, markets[(account.platform, account.currency)]
+                ),
+                valid_accounts,
+            )
+        )
+
+        # fetch the exchange data for every asset held across the group at once
+        list(pool.map(lambda key: fetch_assets_data(groups[key], markets[key]), groups))
+
+        list(
+            pool.map(
+                lambda account: evaluate(
+                    account,
+                    markets[(account.platform, account.currency)],
+                    amount,
+                    rebalance,
+                ),
+                valid_accounts,
+            )
+        )
+
+    return accounts
+
+
+def fetch_coins(accounts, currency):
+    try:
+        return CoinGeckoAPI().get_coins_markets(currency)
+    except Exception as e:
+        log.error(f"Unable to fetch market data from CoinGecko for {currency}: {e}")
+        for account in accounts:
+            account.error = str(e)
+        return None
+
+
+def fetch_market(group, coins, reload=True):
+    account = group[0]
+    if coins is None:
+        return None
+    try:
+        return Market.fetch(
+            account.exchange, account.currency, coins=coins, reload=reload
+        )
+    except Exception as e:
+        log.error(f"Unable to fetch market data from {account.platform}: {e}")
+        for account in group:
+            account.error = str(e)
+        return None
+
+
+def build_holdings(account, market):
+    if account.error or market is None:
+        return
+    try:
+        account.portfolio.build_holdings(account.exchange, market)
+    except Exception as e:
+        log.error(f"Unable to fetch balances for {account.name}: {e}")
+        account.error = str(e)
+
+
+def fetch_assets_data(group, market):
+    valid_accounts = [account for account in group if not account.error]
+    if market is None or not valid_accounts:
+        return
+    assets = sorted(
+        {
+            holding.symbol
+            for account in valid_accounts
+            for holding in account.portfolio.holdings
+        }
+    )
+    exchange = valid_accounts[0].exchange
+    try:
+        market.assets_data = exchange.get_assets_data(assets, market.currency)
+    except Exception as e:
+        log.error(f"Unable to fetch assets data from {group[0].platform}: {e}")
+        for account in valid_accounts:
+            account.error = str(e)
+
+
+def evaluate(account, market, amount, rebalance):
+    if account.error:
+        return
+    try:
+        account.portfolio.update_assets_data(account.exchange, market.assets_data)
+        orders = account.portfolio.invest(amount=amount, rebalance=rebalance)
+        account.orders = sorted(
+            orders, key=lambda order: order.buy_or_sell, reverse=True
+        )
+    except Exception as e:
+        log.error(f"Unable to evaluate the portfolio for {account.name}: {e}")
+        account.error = str(e)
+
+
+@click.command()
+@click.argument("strategies", type=click.File("r"), nargs=-1, required=True)
+@click.option("--amount", default=0, help="Lump sum to invest into each portfolio")
+@click.option(
+    "--rebalance/--no-rebalance",
+    default=True,
+    help="Rebalance the portfolios towards their planned allocation",
+)
+@click.option("--workers", default=8, help="Number of portfolios to evaluate at once")
+@click.option("-v", "--verbose", is_flag=True, help="Increase output verbosity.")
+def batch(strategies, amount, rebalance, workers, verbose):
+    """
+    Evaluate many portfolios at once, sharing the market data between them.
+
+    STRATEGIES: paths to the .toml strategy files - see README for more info
+    """
+    configure_logging(verbose)
+
+    accounts = []
+    for strategy in strategies:
+        name = Path(strategy.name).stem
+        # an invalid strategy file is reported with the other accounts,
+        # rather than stopping the whole batch
+        try:
+            (portfolio, exchange, platform, currency) = load_strategy(strategy)
+        except Exception as e:
+            log.error(f"Unable to load the strategy for {name}: {e}")
+            accounts.append(Account(name, None, None, None, None, error=str(e)))
+            continue
+        accounts.append(Account(name, portfolio, exchange, platform, currency))
+
+    with console.status("[bold green]Evaluating portfolios..."):
+        run_batch(accounts, amount=amount, rebalance=rebalance, workers=workers)
+
+    console.print("[bold]Pending orders and balances for each portfolio:")
+    display_batch_report(accounts)
+
+
+if __name__ == "__main__":
+    try:
+        batch()
+    except KeyboardInterrupt:
+        log.critical("Interrupted by user")
+        try:
+            sys.exit(0)
+        except SystemExit:
+            os._exit(0)
@@ -13,10 +13,11 @@ class Exchange(ABC):
         pass
 
     @abstractmethod
-    def get_available_assets(self, currency):
+    def get_available_assets(self, currency, reload=True):
         """
         given a fiat currency, returns a list of asset symbols which are
-        tradeable using that currency
+        tradeable using that currency. if the 'reload' flag is False, exchanges
+        can reuse the catalogue of assets they loaded previously
         """
         pass
 
@@ -39,8 +40,23 @@ class Exchange(ABC):
         [price]: the price of a unit of the asset
         [fee]: the % fee for a market order trade
 
-        additionally, you can return a generic dictionary in a [exchange_data] field which
-        will be passed to the order objects created when sending a buy / sell command
+        additionally, you can return a lightweight reference in a [exchange_data] field
+        (e.g. the index of the asset pair in a table kept by the exchange) which will be
+        passed to the order objects created when sending a buy / sell command
+        """
+        pass
+
+    @abstractmethod
+    def get_order_book(self, order, count=100):
+        """
+        given a order object, returns the current order book for the asset pair it
+        trades in the form of a dictionary with the following fields:
+
+        [asks]: a list of (price, volume) tuples, sorted by ascending price
+        [bids]: a list of (price, volume) tuples, sorted by descending price
+
+        this method is used by the execution engine to split large orders into
+        smaller child orders, based on the liquidity available in the market
         """
         pass
 
@@ -60,5 +76,10 @@ class Exchange(ABC):
         exchange_data: the [exchange_data] data field returned from get_assets_data()
 
         if the 'mock' flag is False, only run orders validations / simulations
+
+        returns a (success, info) tuple. if the exchange knows the average price the
+        order was filled at and the units it filled, they can be returned in the [price]
+        and [volume] fields of the info dictionary - otherwise the price is estimated
+        from the order book and the order is assumed to be filled completely
         """
-        pass
\ No newline at end of file
+        pass
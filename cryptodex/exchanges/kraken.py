@@ -1,6 +1,10 @@
 from exchanges.exchange import Exchange
 
+import time
 import logging
+import threading
+from array import array
+from typing import Dict, List
 
 from rich.console import Console
 import krakenex
@@ -8,6 +12,8 @@ import krakenex
 log = logging.getLogger(__name__)
 console = Console()
 
+from dataclasses import dataclass, field
+
 SYMBOLS = {
     "btc": "xxbt",
     "doge": "xxdg",
@@ -18,66 +24,213 @@ SYMBOLS = {
 }
 
 
+@dataclass
+class PairTable:
+    """
+    column-oriented table of the asset pairs traded on kraken, parsed from the
+    AssetPairs endpoint. holdings and orders refer to its rows by index, rather
+    than carrying a copy of kraken's full record for their pair around.
+
+    rows are never moved or removed: reloading the catalogue builds a new table
+    with the existing pairs in the same rows, new ones appended and missing ones
+    marked as no longer listed, so a row index means the same pair in every table.
+    tables are never modified once built, so readers can safely use the one they
+    hold while a newer one is being loaded.
+    """
+
+    names: List[str] = field(default_factory=list)
+    bases: List[str] = field(default_factory=list)
+    quotes: List[str] = field(default_factory=list)
+    fees: array = field(default_factory=lambda: array("d"))
+    minimum_orders: array = field(default_factory=lambda: array("d"))
+    listed: bytearray = field(default_factory=bytearray)
+    index: Dict[str, int] = field(default_factory=dict)
+
+    def updated(self, asset_pairs):
+        table = PairTable(
+            list(self.names),
+            list(self.bases),
+            list(self.quotes),
+            array("d", self.fees),
+            array("d", self.minimum_orders),
+            bytearray(len(self.names)),
+            dict(self.index),
+        )
+        for name, pair in asset_pairs.items():
+            base = pair["base"].lower()
+            quote = pair["quote"].lower()
+            fee = float(pair["fees"][0][-1])
+            minimum_order = float(pair.get("ordermin", -1))
+            row = table.index.get(name)
+            if row is None:
+                table.index[name] = len(table.names)
+                table.names.append(name)
+                table.bases.append(base)
+                table.quotes.append(quote)
+                table.fees.append(fee)
+                table.minimum_orders.append(minimum_order)
+                table.listed.append(True)
+            else:
+                table.bases[row] = base
+                table.quotes[row] = quote
+                table.fees[row] = fee
+                table.minimum_orders[row] = minimum_order
+                table.listed[row] = True
+        return table
+
+    def find(self, base, quote):
+        return next(
+            (
+                row
+                for row in range(len(self.names))
+                if self.listed[row]
+                and self.bases[row] == base
+                and self.quotes[row] == quote
+                and not ".d" in self.names[row]
+            ),
+            None,
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+
 class KrakenExchange(Exchange):
-    def __init__(self, key, secret):
+    # the pairs catalogue is public data, so it is shared by every instance.
+    # reloads are serialised so no new rows are lost to a concurrent reload
+    pairs = PairTable()
+    pairs_lock = threading.Lock()
+
+    def __init__(self, key, secret, timeout=30):
         self.api = krakenex.API(key, secret)
+        self.timeout = timeout
+        # private queries are signed with an increasing nonce, so they can't be
+        # sent concurrently from the background threads of the shell / execution
+        self.lock = threading.Lock()
         return
 
+    def query_public(self, method, data=None):
+        return self.api.query_public(method, data=data, timeout=self.timeout)
+
+    def query_private(self, method, data=None):
+        with self.lock:
+            return self.api.query_private(method, data=data, timeout=self.timeout)
+
     def get_symbol(self, symbol):
         return SYMBOLS.get(symbol, symbol)
 
-    def get_available_assets(self, currency):
+    def load_pairs(self):
+        asset_pairs = self.query_public("AssetPairs")["result"]
+        with KrakenExchange.pairs_lock:
+            # swap the new table in with a single assignment
+            KrakenExchange.pairs = KrakenExchange.pairs.updated(asset_pairs)
+            pairs = KrakenExchange.pairs
+        log.debug(f"Loaded {len(asset_pairs)} asset pairs")
+        return pairs
+
+    def get_available_assets(self, currency, reload=True):
+        # (re)load the pairs catalogue, this is called first whenever a portfolio
+        # connects to the exchange so its data is always up to date
+        pairs = self.pairs
+        if reload or not len(pairs):
+            pairs = self.load_pairs()
         # filter assets pairs if they are tradeable with the desired currency
         # planning to use fiat currencies only for trading so adding a 'z' before it
         # https://support.kraken.com/hc/en-us/articles/360001185506-How-to-interpret-asset-codes
-        asset_pairs = self.api.query_public("AssetPairs")["result"]
-        tradeable_pairs = [
-            asset
-            for asset in asset_pairs.values()
-            if asset["quote"].lower() == f"z{currency}"
-        ]
         # return array of asset symbols, present as 'base' attribute in the asset pairs
-        return [asset["base"].lower() for asset in tradeable_pairs]
+        return [
+            pairs.bases[row]
+            for row in range(len(pairs))
+            if pairs.listed[row] and pairs.quotes[row] == f"z{currency}"
+        ]
 
     def get_owned_assets(self):
         return {
             key.lower(): value
-            for key, value in self.api.query_private("Balance")["result"].items()
+            for key, value in self.query_private("Balance")["result"].items()
             if float(value) > 0
         }
 
     def get_assets_data(self, assets, currency):
-        asset_pairs = self.api.query_public("AssetPairs")["result"]
-        assets_data = [
-            {
-                "pair_name": assetpair,
-                "symbol": asset["base"].lower(),
-                "fee": asset["fees"][0][-1],
-                "minimum_order": float(asset.get("ordermin", -1)),
-                "exchange_data": {"asset_pair": assetpair, **asset},
-            }
-            for assetpair, asset in asset_pairs.items()
-            if asset["base"].lower() in assets
-            and asset["quote"].lower() == f"z{currency}"
+        pairs = self.pairs
+        if not len(pairs):
+            pairs = self.load_pairs()
+        assets = set(assets)
+        rows = [
+            row
+            for row, name in enumerate(pairs.names)
+            if pairs.listed[row]
+            and pairs.bases[row] in assets
+            and pairs.quotes[row] == f"z{currency}"
             # ignore any trade pairs in dark pools
             # https://github.com/mobnetic/BitcoinChecker/issues/166#issuecomment-132743218
-            and not ".d" in assetpair
+            and not ".d" in name
+        ]
+        tickers_pair = ",".join([pairs.names[row] for row in rows])
+        tickers = self.query_public("Ticker", data={"pair": tickers_pair})["result"]
+        # only return the pairs which got a price in this response, rather than
+        # leaving a missing or stale price for the portfolio to divide by
+        prices = {
+            pairs.index[name]: float(ticker["c"][0])
+            for name, ticker in tickers.items()
+            if name in pairs.index
+        }
+        for row in rows:
+            if not row in prices:
+                log.warning(f"No ticker price returned for {pairs.names[row]}")
+        return [
+            {
+                "symbol": pairs.bases[row],
+                "fee": pairs.fees[row],
+                "minimum_order": pairs.minimum_orders[row],
+                "price": prices[row],
+                "exchange_data": row,
+            }
+            for row in rows
+            if row in prices
         ]
-        tickers_pair = ",".join([asset["pair_name"] for asset in assets_data])
-        tickers = self.api.query_public("Ticker", data={"pair": tickers_pair})["result"]
-        for asset in assets_data:
-            pair_name = asset["pair_name"]
-            asset["price"] = tickers[pair_name]["c"][0]
-        return assets_data
 
-    def process_order(self, order, mock=True):
-        if not "asset_pair" in order.exchange_data:
-            log.debug(
-                "asset_pair parameter not found in exchange_data, attempting to build manually"
-            )
-        pair = order.exchange_data.get(
-            "asset_pair", f"{order.symbol.upper()}{order.currency.upper()}"
+    def get_pair(self, order):
+        pairs = self.pairs
+        base = order.symbol.lower()
+        quote = f"z{order.currency.lower()}"
+        row = order.exchange_data
+        # make sure the row still refers to the pair the order was created for,
+        # never send an order to a different pair than the one it was built with
+        if (
+            isinstance(row, int)
+            and 0 <= row < len(pairs)
+            and pairs.listed[row]
+            and pairs.bases[row] == base
+            and pairs.quotes[row] == quote
+        ):
+            return pairs.names[row]
+        if row is not None:
+            log.warning(f"Asset pair row {row} does not match {order.symbol}")
+        row = pairs.find(base, quote)
+        if row is not None:
+            return pairs.names[row]
+        log.debug(
+            "asset pair row not found in exchange_data, attempting to build manually"
         )
+        return f"{order.symbol.upper()}{order.currency.upper()}"
+
+    def get_order_book(self, order, count=100):
+        pair = self.get_pair(order)
+        depth = self.query_public("Depth", data={"pair": pair, "count": count})
+        if depth["error"]:
+            log.warning(f"Unable to fetch order book for {pair}: {depth['error']}")
+            return {"asks": [], "bids": []}
+        # the result is keyed by kraken's own name for the pair, which might differ
+        # from the one we queried with, so just take the only entry in it
+        book = next(iter(depth["result"].values()))
+        return {
+            side: [(float(price), float(volume)) for price, volume, _ in book[side]]
+            for side in ["asks", "bids"]
+        }
+
+    def process_order(self, order, mock=True):
+        pair = self.get_pair(order)
         log.info(
             f"Processing {order.buy_or_sell.upper()} order for "
             f"{round(order.units, 5)} units of {order.symbol} ({pair})"
@@ -90,8 +243,37 @@ class KrakenExchange(Exchange):
         }
         if mock:
             order_data["validate"] = True
-        order_result = self.api.query_private("AddOrder", data=order_data)
+        order_result = self.query_private("AddOrder", data=order_data)
         if order_result["error"]:
             return (False, order_result["error"])
-        else:
+        if mock:
             return (True, order_result["result"])
+        # AddOrder only returns the ids of the orders it created, so query them
+        # to report the average price and the volume they were actually filled at
+        info = dict(order_result["result"])
+        info.update(self.get_order_fill(info.get("txid", [])))
+        return (True, info)
+
+    def get_order_fill(self, txids, attempts=5, delay=1.0):
+        """
+        returns the average [price] and executed [volume] of the given orders,
+        waiting for them to close for a few attempts. Orders which are still open
+        only report the volume filled so far, and no price if nothing was filled
+        """
+        orders = {}
+        for attempt in range(attempts):
+            result = self.query_private("QueryOrders", data={"txid": ",".join(txids)})
+            if result["error"]:
+                log.warning(f"Unable to query orders {txids}: {result['error']}")
+                return {}
+            orders = result["result"]
+            statuses = [order["status"] for order in orders.values()]
+            if all(status in ["closed", "canceled", "expired"] for status in statuses):
+                break
+            time.sleep(delay)
+
+        volume = sum([float(order["vol_exec"]) for order in orders.values()])
+        cost = sum([float(order["cost"]) for order in orders.values()])
+        if not volume:
+            return {"volume": 0.0}
+        return {"price": cost / volume, "volume": volume}
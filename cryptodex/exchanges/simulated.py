@@ -0,0 +1,142 @@
+from exchanges.exchange import Exchange
+
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class SimulatedExchange(Exchange):
+    """
+    an offline exchange backed by synthetic order books, used to test the execution
+    engine and the portfolio logic without sending any request to a real exchange.
+
+    assets: dictionary mapping asset symbols to their mid price
+    balances: dictionary mapping asset symbols to the amount of units owned
+    spread: the % difference between the best ask and the best bid
+    step: the % difference in price between two consecutive levels of the book
+    levels: the amount of price levels generated on each side of the book
+    volume: the amount of units available at each price level
+    refill: if True, restore the book to its initial depth after every order,
+        simulating liquidity being replenished between child orders
+    """
+
+    def __init__(
+        self,
+        key=None,
+        secret=None,
+        assets=None,
+        balances=None,
+        fee=0.26,
+        minimum_order=0.0,
+        spread=0.1,
+        step=0.05,
+        levels=20,
+        volume=1.0,
+        refill=False,
+    ):
+        self.assets = dict(assets or {})
+        self.balances = {k: float(v) for k, v in (balances or {}).items()}
+        self.fee = fee
+        self.minimum_order = minimum_order
+        self.books = {
+            symbol: self.build_order_book(price, spread, step, levels, volume)
+            for symbol, price in self.assets.items()
+        }
+        self.refill = refill
+        self.initial_books = {
+            symbol: {side: list(levels) for side, levels in book.items()}
+            for symbol, book in self.books.items()
+        }
+        self.lock = threading.Lock()
+        return
+
+    @staticmethod
+    def build_order_book(price, spread, step, levels, volume):
+        half_spread = spread / 200
+        return {
+            "asks": [
+                (price * (1 + half_spread + i * step / 100), volume)
+                for i in range(levels)
+            ],
+            "bids": [
+                (price * (1 - half_spread - i * step / 100), volume)
+                for i in range(levels)
+            ],
+        }
+
+    def get_symbol(self, symbol):
+        return symbol
+
+    def get_available_assets(self, currency, reload=True):
+        return list(self.assets.keys())
+
+    def get_owned_assets(self):
+        return {
+            symbol: str(amount)
+            for symbol, amount in self.balances.items()
+            if amount > 0
+        }
+
+    def get_assets_data(self, assets, currency):
+        return [
+            {
+                "symbol": symbol,
+                "fee": self.fee,
+                "minimum_order": self.minimum_order,
+                "price": price,
+                "exchange_data": row,
+            }
+            for row, (symbol, price) in enumerate(self.assets.items())
+            if symbol in assets
+        ]
+
+    def get_order_book(self, order, count=100):
+        with self.lock:
+            book = self.books.get(order.symbol, {"asks": [], "bids": []})
+            return {side: list(book[side][:count]) for side in ["asks", "bids"]}
+
+    def process_order(self, order, mock=True):
+        with self.lock:
+            if not order.symbol in self.books:
+                return (False, [f"Unknown asset pair for {order.symbol}"])
+
+            # walk the opposite side of the book, filling the order level by level
+            side = "asks" if order.buy_or_sell == "buy" else "bids"
+            levels = list(self.books[order.symbol][side])
+            remaining = order.units
+            filled_cost = 0.0
+            while remaining > 0 and levels:
+                price, volume = levels[0]
+                traded = min(remaining, volume)
+                filled_cost += traded * price
+                remaining -= traded
+                if traded < volume:
+                    levels[0] = (price, volume - traded)
+                else:
+                    levels.pop(0)
+
+            if remaining > 1e-12:
+                return (False, [f"Not enough liquidity to fill {order.units} units"])
+
+            average_price = filled_cost / order.units
+            if not mock:
+                # consume the liquidity from the book and update the balances
+                if self.refill:
+                    self.books[order.symbol][side] = list(
+                        self.initial_books[order.symbol][side]
+                    )
+                else:
+                    self.books[order.symbol][side] = levels
+                sign = 1 if order.buy_or_sell == "buy" else -1
+                self.balances[order.symbol] = (
+                    self.balances.get(order.symbol, 0.0) + sign * order.units
+                )
+                self.balances[order.currency] = (
+                    self.balances.get(order.currency, 0.0) - sign * filled_cost
+                )
+            log.debug(
+                f"Simulated {order.buy_or_sell} of {order.units} {order.symbol} "
+                f"at an average price of {average_price}"
+            )
+            return (True, {"price": average_price, "volume": order.units})
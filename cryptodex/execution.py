@@ -0,0 +1,253 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from portfolio import Order
+
+log = logging.getLogger(__name__)
+
+from dataclasses import dataclass, field
+
+STRATEGIES = ["market", "depth", "twap"]
+
+
+@dataclass
+class Execution:
+    order: Order
+    expected_price: float
+    units: float = 0.0
+    cost: float = 0.0
+    children: int = 0
+    errors: list = field(default_factory=list)
+    # whether the achieved price was estimated from the order book, rather than
+    # reported by the exchange for at least one of the child orders
+    estimated: bool = False
+
+    @property
+    def achieved_price(self):
+        return self.cost / self.units if self.units else 0.0
+
+    @property
+    def slippage(self):
+        # positive slippage means the order was filled at a worse price than expected
+        # (paid more for a purchase, or received less for a sale)
+        if not self.units or not self.expected_price:
+            return 0.0
+        sign = 1 if self.order.buy_or_sell == "buy" else -1
+        return sign * 100 * (self.achieved_price / self.expected_price - 1)
+
+
+def get_child_order(order, units):
+    # orders take negative units for purchases and positive ones for sales,
+    # so flip the sign back before creating the child order
+    sign = -1 if order.buy_or_sell == "buy" else 1
+    cost = order.cost * units / order.units if order.units else 0
+    return Order(
+        order.symbol,
+        order.currency,
+        sign * units,
+        cost,
+        order.minimum_order,
+        order.exchange_data,
+    )
+
+
+def estimate_fill_price(levels, units):
+    """
+    returns the average price of filling a number of units against the given
+    order book levels, or None if the book is not deep enough
+    """
+    remaining = units
+    cost = 0.0
+    for price, volume in levels:
+        traded = min(remaining, volume)
+        cost += traded * price
+        remaining -= traded
+        if remaining <= 0:
+            return cost / units
+    return None
+
+
+def get_available_liquidity(levels, max_slippage):
+    """
+    returns the amount of units that can be traded from the given order book levels
+    without moving the price more than max_slippage % away from the best price
+    """
+    if not levels:
+        return 0.0
+    best_price = levels[0][0]
+    return sum(
+        volume
+        for price, volume in levels
+        if abs(price - best_price) <= best_price * max_slippage / 100
+    )
+
+
+class ExecutionEngine:
+    """
+    sends orders to the exchange, optionally splitting them in smaller child orders
+    to reduce their impact on the market price:
+
+    market: send each order as a single market order
+    depth: size each child order by the liquidity available in the order book
+        within max_slippage % of the best price, waiting interval seconds between them
+    twap: split each order in equal child orders spread over time, interval
+        seconds apart, capping each of them by the liquidity as above
+
+    orders for different asset pairs are scheduled concurrently.
+    """
+
+    def __init__(
+        self,
+        exchange,
+        strategy="market",
+        slices=5,
+        interval=1.0,
+        max_slippage=0.5,
+        max_children=100,
+        workers=8,
+    ):
+        if not strategy in STRATEGIES:
+            raise ValueError(f"Unknown execution strategy {strategy}")
+        self.exchange = exchange
+        self.strategy = strategy
+        self.slices = max(1, slices)
+        self.interval = interval
+        self.max_slippage = max_slippage
+        self.max_children = max_children
+        self.workers = workers
+
+    def execute(self, orders, mock=True, cancel=None):
+        orders = [order for order in orders if order.units]
+        if not orders:
+            return []
+
+        # group orders by asset pair so child orders of the same pair are
+        # sent sequentially, while different pairs are processed concurrently
+        pairs = {}
+        for order in orders:
+            pairs.setdefault(order.symbol, []).append(order)
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(pairs))) as pool:
+            results = pool.map(
+                lambda pair_orders: [
+                    self.execute_order(order, mock, cancel) for order in pair_orders
+                ],
+                pairs.values(),
+            )
+            executions = {
+                id(execution.order): execution
+                for pair_executions in results
+                for execution in pair_executions
+            }
+
+        # return the executions in the same order as the orders they belong to
+        return [executions[id(order)] for order in orders]
+
+    def execute_order(self, order, mock=True, cancel=None):
+        expected_price = abs(order.cost) / order.units if order.units else 0.0
+        execution = Execution(order, expected_price)
+        # record any failure on the execution itself, so one pair failing doesn't
+        # lose the report of the child orders already filled for the other pairs.
+        # failures are only logged at debug level, as executions may run in the
+        # background and are reported once complete
+        try:
+            return self.execute_children(execution, mock, cancel)
+        except Exception as e:
+            log.debug(f"There was a problem executing the {order.symbol} order: {e}")
+            execution.errors.append(str(e))
+            return execution
+
+    def execute_children(self, execution, mock=True, cancel=None):
+        order = execution.order
+        if cancel and cancel.is_set():
+            execution.errors.append("Cancelled")
+            return execution
+
+        if self.strategy == "market":
+            self.send_child(execution, order, mock)
+            return execution
+
+        slice_units = order.units / self.slices
+        remaining = order.units
+        while remaining > 0 and execution.children < self.max_children:
+            (units, book) = self.get_child_units(order, remaining, slice_units)
+            if not units:
+                execution.errors.append("No liquidity available in the order book")
+                break
+            child = get_child_order(order, units)
+            if not self.send_child(execution, child, mock, book):
+                break
+            remaining -= units
+            if remaining > 0 and self.interval:
+                # wait on the cancel event rather than sleeping, so a cancelled
+                # execution stops without waiting for the full interval
+                if cancel:
+                    cancel.wait(self.interval)
+                else:
+                    time.sleep(self.interval)
+            if remaining > 0 and cancel and cancel.is_set():
+                execution.errors.append(f"Cancelled with {remaining} units left")
+                break
+
+        if remaining > 0 and not execution.errors:
+            execution.errors.append(
+                f"Reached the maximum of {self.max_children} child orders "
+                f"with {remaining} units left"
+            )
+        return execution
+
+    def get_child_units(self, order, remaining, slice_units):
+        book = self.exchange.get_order_book(order)
+        levels = book["asks"] if order.buy_or_sell == "buy" else book["bids"]
+        liquidity = get_available_liquidity(levels, self.max_slippage)
+
+        units = min(remaining, liquidity)
+        if self.strategy == "twap":
+            units = min(units, slice_units)
+        if not units:
+            return (0.0, book)
+
+        # child orders can't be smaller than the minimum order size, and we don't
+        # want to leave a remainder too small to be traded in a later order either
+        minimum_order = float(order.minimum_order)
+        units = max(units, minimum_order)
+        if remaining - units < max(minimum_order, 1e-12):
+            units = remaining
+        return (min(units, remaining), book)
+
+    def send_child(self, execution, child, mock, book=None):
+        if book is None:
+            book = self.exchange.get_order_book(child)
+
+        (success, info) = self.exchange.process_order(child, mock=mock)
+        execution.children += 1
+        if not success:
+            log.debug(f"There was a problem with the order: {info}")
+            execution.errors.append(str(info))
+            return False
+
+        log.debug(f"The order executed successfully: {info}")
+        info = info if isinstance(info, dict) else {}
+        # use the volume filled reported by the exchange if available, otherwise
+        # assume the order was filled completely
+        units = float(info.get("volume", child.units))
+        if units < child.units:
+            execution.errors.append(
+                f"Order filled for {units} out of {child.units} units"
+            )
+        if not units:
+            return False
+
+        # use the fill price reported by the exchange if available, otherwise
+        # estimate it by walking the order book fetched before sending the order
+        price = info.get("price")
+        if price is None:
+            execution.estimated = True
+            levels = book["asks"] if child.buy_or_sell == "buy" else book["bids"]
+            price = estimate_fill_price(levels, units)
+        if price is None:
+            price = execution.expected_price
+        execution.units += units
+        execution.cost += units * float(price)
+        return True
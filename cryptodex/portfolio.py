@@ -2,6 +2,7 @@ import logging
 import math
 import toml
 from copy import deepcopy
+from typing import Optional
 
 from rich.console import Console
 
@@ -28,7 +29,7 @@ class Holding:
     target: float = 0.0
     allocation: float = 0.0
     minimum_order: float = 0
-    exchange_data: dict = field(default_factory=dict)
+    exchange_data: Optional[int] = None
     order_data: dict = field(default_factory=dict)
 
 
@@ -40,7 +41,7 @@ class Order:
     cost: float
     buy_or_sell: str = field(init=False)
     minimum_order: float = 0.0
-    exchange_data: dict = field(default_factory=dict)
+    exchange_data: Optional[int] = None
 
     # on order initialization, set its type (buy or sell) based on the amount of units
     # being traded (negative units means purchase order, positive means sell order)
@@ -50,13 +51,44 @@ class Order:
         self.units = abs(self.units)
 
 
+@dataclass
+class Market:
+    currency: str
+    coins: list
+    available_assets: list
+    assets_data: list = None
+
+    # fetch the market data shared by all the portfolios trading with the given
+    # currency on an exchange, so it can be reused across many portfolios
+    @classmethod
+    def fetch(cls, exchange, currency, coins=None, reload=True):
+        if coins is None:
+            coins = CoinGeckoAPI().get_coins_markets(currency)
+        available_assets = exchange.get_available_assets(currency, reload=reload)
+        return cls(currency, coins, available_assets)
+
+
 class Portfolio:
-    def connect(self, exchange):
+    def connect(self, exchange, market=None):
+        if market is None:
+            market = Market.fetch(exchange, self.currency)
+        self.build_holdings(exchange, market)
+
+        # unless the market already holds the exchange data for its assets, create a
+        # list of all the symbols of the assets we hold in the portfolio, and pass
+        # that to the get_assets_data() method on the exchange to get the exchange
+        # data for each asset
+        assets_data = market.assets_data
+        if assets_data is None:
+            assets_list = [holding.symbol for holding in self.holdings]
+            assets_data = exchange.get_assets_data(assets_list, self.currency)
+        self.update_assets_data(exchange, assets_data)
+
+    def build_holdings(self, exchange, market):
         self.holdings = []
-        cg = CoinGeckoAPI()
-        market_data = cg.get_coins_markets(self.currency)
+        market_data = market.coins
+        available_assets = market.available_assets
         owned_assets = exchange.get_owned_assets()
-        available_assets = exchange.get_available_assets(self.currency)
         excluded_assets = [asset.lower() for asset in self.model["exclude"]]
 
         # create a copy of the owned assets dict for us to modify later
@@ -120,12 +152,7 @@ class Portfolio:
         # based on the square root of its market cap
         self.allocate_by_sqrt_market_cap()
 
-        # create a list of all the symbols of the assets we hold in the portfolio,
-        # and pass that to the get_assets_data() method on the exchange to get
-        # the exchange data for each asset
-        assets_list = [holding.symbol for holding in self.holdings]
-        assets_data = exchange.get_assets_data(assets_list, self.currency)
-
+    def update_assets_data(self, exchange, assets_data):
         # go through each asset in our portfolio and, finding its corresponding asset
         # in the exchange's data list, fill up its price / fee / minimum order fields
         for holding in self.holdings:
@@ -139,7 +166,7 @@ class Portfolio:
                 holding.minimum_order = exchange_asset["minimum_order"]
                 holding.exchange_data = exchange_asset["exchange_data"]
             else:
-                console.warning(
+                log.warning(
                     f"Unable to fetch data for asset {exchange_symbol} "
                     "Even though it was originally marked as available in the exchange... "
                     "Something went really wrong!"
@@ -153,6 +180,21 @@ class Portfolio:
         orders = []
         funds = amount
         holdings = deepcopy([holding for holding in self.holdings if not holding.frozen])
+
+        # leave out the holdings the exchange returned no price for, as they can't
+        # be valued or traded, and spread their target over the remaining ones
+        unpriced_holdings = [holding for holding in holdings if not holding.price]
+        if unpriced_holdings:
+            symbols = ", ".join([holding.symbol for holding in unpriced_holdings])
+            log.warning(f"No price available for {symbols}, leaving them out")
+            holdings = [holding for holding in holdings if holding.price]
+            total_target = sum([holding.target for holding in holdings])
+            if not total_target:
+                log.warning("No priced assets left to invest into")
+                return []
+            for holding in holdings:
+                holding.target = 100 * holding.target / total_target
+
         total_value = sum([holding.price * holding.amount for holding in holdings])
 
         if rebalance:
@@ -0,0 +1,53 @@
+import logging
+
+import toml
+
+from portfolio import Portfolio
+from exchanges.kraken import KrakenExchange
+from exchanges.simulated import SimulatedExchange
+
+log = logging.getLogger(__name__)
+
+EXCHANGES = {"kraken": KrakenExchange, "simulated": SimulatedExchange}
+
+
+def validate_strategy(strategy):
+    # raise rather than exiting, so that running many strategies at once
+    # only leaves out the ones which are invalid
+    for field in ["currency", "portfolio", "exchange"]:
+        if not field in strategy:
+            raise ValueError(f"{field} not defined in strategy file")
+
+    for field in ["platform", "key", "secret"]:
+        if not field in strategy["exchange"]:
+            raise ValueError(f"{field} not defined for the exchange")
+
+    if not strategy["exchange"]["platform"] in EXCHANGES:
+        raise ValueError("Exchange platform not supported")
+
+
+def load_strategy(strategy):
+    """
+    returns the (portfolio, exchange, platform, currency) defined in a strategy file,
+    or raises a ValueError if the file is not a valid strategy
+    """
+    data = toml.load(strategy)
+    validate_strategy(data)
+
+    currency = data["currency"]
+    portfolio = Portfolio(data["portfolio"], currency)
+    exchange_platform = data["exchange"]["platform"]
+    # any other field of the exchange table is passed on to the exchange itself,
+    # e.g. the assets / balances / order book settings of the simulated exchange
+    exchange_options = {
+        key: value
+        for key, value in data["exchange"].items()
+        if not key in ["platform", "key", "secret"]
+    }
+    try:
+        exchange = EXCHANGES[exchange_platform](
+            data["exchange"]["key"], data["exchange"]["secret"], **exchange_options
+        )
+    except TypeError as e:
+        raise ValueError(f"Invalid options for the {exchange_platform} exchange: {e}")
+    return (portfolio, exchange, exchange_platform, currency)
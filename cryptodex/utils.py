@@ -1,6 +1,8 @@
 import csv
+import logging
 
 from rich.console import Console
+from rich.logging import RichHandler
 from rich.table import Table
 
 console = Console()
@@ -8,6 +10,15 @@ console = Console()
 CURRENCIES = {"eur": "€", "usd": "$", "gbp": "£"}
 
 
+def configure_logging(verbose):
+    log = logging.getLogger()
+    log.setLevel(logging.INFO if not verbose else logging.DEBUG)
+    rich_handler = RichHandler()
+    rich_handler.setFormatter(logging.Formatter(fmt="%(message)s", datefmt="[%X]"))
+    log.addHandler(rich_handler)
+    log.propagate = False
+
+
 def format_currency(value, currency):
     return f"{round(value, 2)} {CURRENCIES.get(currency, '')}"
 
@@ -99,3 +110,111 @@ def display_orders(orders):
             style=row_style,
         )
     console.print(table)
+
+
+def display_executions(executions):
+    table = Table()
+    table.add_column("Asset")
+    table.add_column("Order Type")
+    table.add_column("Units")
+    table.add_column("Child Orders")
+    table.add_column("Expected Price")
+    table.add_column("Achieved Price")
+    table.add_column("Slippage %")
+    table.add_column("Errors")
+    for execution in executions:
+        order = execution.order
+        name = f"[bold]{order.symbol.upper()}"
+        buy_or_sell = order.buy_or_sell.upper()
+        units = f"{execution.units:.5f} / {order.units:.5f}"
+        expected_price = f"{execution.expected_price:.5f}"
+        achieved_price = f"{execution.achieved_price:.5f}"
+        if execution.estimated:
+            achieved_price = f"~{achieved_price} (estimated)"
+        slippage = f"{execution.slippage:.2f}%"
+        row_style = "red" if execution.errors else "green"
+        table.add_row(
+            name,
+            buy_or_sell,
+            units,
+            str(execution.children),
+            expected_price,
+            achieved_price,
+            slippage,
+            "\n".join(execution.errors),
+            style=row_style,
+        )
+    console.print(table)
+
+
+def display_order_results(results):
+    table = Table()
+    table.add_column("Asset")
+    table.add_column("Order Type")
+    table.add_column("Units")
+    table.add_column("Result")
+    for (order, success, info) in results:
+        table.add_row(
+            f"[bold]{order.symbol.upper()}",
+            order.buy_or_sell.upper(),
+            f"{order.units:.5f}",
+            str(info),
+            style="green" if success else "red",
+        )
+    console.print(table)
+
+
+def display_batch_report(accounts):
+    orders_table = Table()
+    orders_table.add_column("Account")
+    orders_table.add_column("Asset")
+    orders_table.add_column("Order Type")
+    orders_table.add_column("Units")
+    orders_table.add_column("Balance")
+    orders_table.add_column("Min. Order")
+    for account in accounts:
+        for order in account.orders:
+            row_style = (
+                "red" if float(abs(order.units)) < float(order.minimum_order) else "green"
+            )
+            orders_table.add_row(
+                account.name,
+                f"[bold]{order.symbol.upper()}",
+                order.buy_or_sell.upper(),
+                f"{order.units:.5f}",
+                format_currency(order.cost, order.currency),
+                str(order.minimum_order),
+                style=row_style,
+                end_section=(order == account.orders[-1]),
+            )
+    console.print(orders_table)
+
+    balance_table = Table()
+    balance_table.add_column("Account")
+    balance_table.add_column("Value")
+    balance_table.add_column("Max. Drift %")
+    balance_table.add_column("Orders")
+    balance_table.add_column("Invalid Orders")
+    for account in accounts:
+        if account.error:
+            balance_table.add_row(account.name, f"[red]{account.error}", style="dim")
+            continue
+        holdings = account.portfolio.holdings
+        value = sum([h.price * h.amount for h in holdings])
+        drift = max(
+            [abs(h.allocation - h.target) for h in holdings if not h.frozen],
+            default=0,
+        )
+        invalid_orders = [
+            order
+            for order in account.orders
+            if float(abs(order.units)) < float(order.minimum_order)
+        ]
+        balance_table.add_row(
+            account.name,
+            format_currency(value, account.currency),
+            f"{drift:.2f}%",
+            str(len(account.orders)),
+            str(len(invalid_orders)),
+        )
+    console.print(balance_table)